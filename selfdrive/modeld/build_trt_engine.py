@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+import re
+import hashlib
+import argparse
+import functools
+import pathlib
+import numpy as np
+import tensorrt as trt
+from cuda import cudart
+
+from openpilot.common.file_helpers import atomic_write_in_dir
+from openpilot.selfdrive.modeld.runners.trtmodel import TRT_LOGGER, cuda_call
+from openpilot.selfdrive.frogpilot.controls.lib.model_manager import DEFAULT_MODEL
+
+MODELS_DIR = pathlib.Path(__file__).parent / 'models'
+
+# the camera frames are by far the largest inputs, feed them in half precision
+FP16_INPUTS = ('input_imgs', 'big_input_imgs')
+
+# regression heads whose numerics matter most stay in FP16 when quantizing the rest of the net to INT8
+FP16_LAYERS = r'(^|/)(pose|desired_curv)(/|$)'
+
+class EntropyCalibrator(trt.IInt8EntropyCalibrator2):
+  """Feeds input sets dumped by the ONNX runner (see DUMP_INPUTS_DIR) to the INT8 calibration."""
+  def __init__(self, sample_paths:list[pathlib.Path], network, cache_path:pathlib.Path):
+    super().__init__()
+    self.sample_paths = sample_paths
+    self.cache_path = cache_path
+    self.idx = 0
+
+    self.input_dtypes = {}
+    self.device_buffers = {}
+    for i in range(network.num_inputs):
+      tensor = network.get_input(i)
+      self.input_dtypes[tensor.name] = np.dtype(trt.nptype(tensor.dtype))
+      self.device_buffers[tensor.name] = cuda_call(cudart.cudaMalloc(trt.volume(tensor.shape) * self.input_dtypes[tensor.name].itemsize))
+
+  def __del__(self):
+    for ptr in self.device_buffers.values():
+      cudart.cudaFree(ptr)
+
+  def get_batch_size(self):
+    return 1
+
+  def get_batch(self, names):
+    if self.idx >= len(self.sample_paths):
+      return None
+    with np.load(self.sample_paths[self.idx]) as sample:
+      for name in names:
+        data = np.ascontiguousarray(sample[name], dtype=self.input_dtypes[name])
+        cuda_call(cudart.cudaMemcpy(self.device_buffers[name], data.ctypes.data, data.nbytes, cudart.cudaMemcpyKind.cudaMemcpyHostToDevice))
+    self.idx += 1
+    return [int(self.device_buffers[name]) for name in names]
+
+  def read_calibration_cache(self):
+    if self.cache_path.exists():
+      return self.cache_path.read_bytes()
+    return None
+
+  def write_calibration_cache(self, cache):
+    self.cache_path.write_bytes(cache)
+
+@functools.cache
+def hash_file(path:pathlib.Path) -> str:
+  return hashlib.sha1(path.read_bytes()).hexdigest()
+
+def get_engine_config(model_name:str, disable_nav:bool, disable_radar:bool, secret_good_openpilot:bool) -> str:
+  return f"{model_name}-{disable_nav}-{disable_radar}-{secret_good_openpilot}"
+
+def get_engine_path(onnx_path:pathlib.Path, config:str, precision:str = 'fp16') -> pathlib.Path:
+  # engines are specific to the ONNX graph they were built from, the model configuration and the TensorRT version
+  engine_key = hashlib.sha1(f"{hash_file(onnx_path)}-{config}-{trt.__version__}".encode()).hexdigest()
+  return MODELS_DIR / f'{engine_key}.{precision}.engine'
+
+def build_engine(onnx_path:pathlib.Path, engine_path:pathlib.Path, calibration_dir:pathlib.Path|None = None, fp16_layers:str = FP16_LAYERS) -> None:
+  builder = trt.Builder(TRT_LOGGER)
+  network = builder.create_network(1 << int(trt.NetworkDefinitionCreationFlag.EXPLICIT_BATCH))
+  parser = trt.OnnxParser(network, TRT_LOGGER)
+  if not parser.parse_from_file(str(onnx_path)):
+    errors = '\n'.join(str(parser.get_error(i)) for i in range(parser.num_errors))
+    raise RuntimeError(f"failed to parse {onnx_path}:\n{errors}")
+
+  # modeld always runs batch 1 at fixed input sizes, so pin every input to a static shape
+  for i in range(network.num_inputs):
+    tensor = network.get_input(i)
+    tensor.shape = tuple(1 if dim < 0 else dim for dim in tensor.shape)
+    # everything but the camera frames is exchanged with modeld's float32 buffers, whatever the ONNX graph declares
+    tensor.dtype = trt.float16 if tensor.name in FP16_INPUTS else trt.float32
+  network.get_output(0).dtype = trt.float32
+
+  config = builder.create_builder_config()
+  config.set_flag(trt.BuilderFlag.FP16)
+  free_memory, _ = cuda_call(cudart.cudaMemGetInfo())
+  config.set_memory_pool_limit(trt.MemoryPoolType.WORKSPACE, free_memory)
+
+  if calibration_dir is not None:
+    sample_paths = sorted(calibration_dir.glob('*.npz'))
+    if not sample_paths:
+      raise RuntimeError(f"no calibration samples in {calibration_dir}")
+    config.set_flag(trt.BuilderFlag.INT8)
+    config.set_flag(trt.BuilderFlag.OBEY_PRECISION_CONSTRAINTS)
+    config.int8_calibrator = EntropyCalibrator(sample_paths, network, engine_path.with_suffix('.calib'))
+
+    fp16_pattern = re.compile(fp16_layers)
+    fp16_layer_names = []
+    for i in range(network.num_layers):
+      layer = network.get_layer(i)
+      if not fp16_pattern.search(layer.name):
+        continue
+      # shape and index tensors are INT32/bool, forcing those to FP16 would break the build
+      float_outputs = [j for j in range(layer.num_outputs) if layer.get_output(j).dtype in (trt.float32, trt.float16)]
+      if not float_outputs:
+        continue
+      layer.precision = trt.float16
+      for j in float_outputs:
+        layer.set_output_type(j, trt.float16)
+      fp16_layer_names.append(layer.name)
+    # layer names depend on how the model was exported, a pattern matching nothing would quietly quantize the heads too
+    if not fp16_layer_names:
+      raise RuntimeError(f"no layers in {onnx_path} match --fp16-layers '{fp16_layers}'")
+    print(f'keeping {len(fp16_layer_names)} layers in FP16:', *fp16_layer_names, sep='\n  ')
+
+  serialized_engine = builder.build_serialized_network(network, config)
+  if serialized_engine is None:
+    raise RuntimeError(f"failed to build TensorRT engine from {onnx_path}")
+
+  # written atomically, a partially written engine would otherwise be picked up as cached on the next start
+  with atomic_write_in_dir(str(engine_path), mode='wb', overwrite=True) as f:
+    f.write(serialized_engine)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Build a TensorRT engine from an ONNX model")
+  parser.add_argument("onnx_path", type=pathlib.Path)
+  parser.add_argument("--output", type=pathlib.Path, help="engine path, defaults to the engine modeld loads for the given model configuration")
+  parser.add_argument("--model-name", default=DEFAULT_MODEL, help="selected model the engine is built for")
+  parser.add_argument("--navigationless", action="store_true", help="model is navigationless")
+  parser.add_argument("--radarless", action="store_true", help="model is radarless")
+  parser.add_argument("--secret-good-openpilot", action="store_true", help="model uses the secret-good-openpilot inputs")
+  parser.add_argument("--calibration-dir", type=pathlib.Path, help="directory of input .npz dumps, enables INT8 quantization")
+  parser.add_argument("--fp16-layers", default=FP16_LAYERS, help="regex of layer names kept in FP16 when quantizing")
+  args = parser.parse_args()
+
+  precision = 'int8' if args.calibration_dir is not None else 'fp16'
+  config = get_engine_config(args.model_name, args.navigationless, args.radarless, args.secret_good_openpilot)
+  engine_path = args.output or get_engine_path(args.onnx_path, config, precision)
+  build_engine(args.onnx_path, engine_path, args.calibration_dir, args.fp16_layers)
+  print(f'saved engine to {engine_path}')
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 import os
+import copy
 import time
 import pickle
+import threading
 import numpy as np
+from itertools import chain, islice
 import cereal.messaging as messaging
 from cereal import car, log
 from pathlib import Path
@@ -18,7 +21,7 @@ from openpilot.common.transformations.model import get_warp_matrix
 from openpilot.system import sentry
 from openpilot.selfdrive.car.car_helpers import get_demo_car_params
 from openpilot.selfdrive.controls.lib.desire_helper import DesireHelper
-from openpilot.selfdrive.modeld.runners import ModelRunner, Runtime
+from openpilot.selfdrive.modeld.runners import ModelRunner, Runtime, USE_TENSORRT, host_zeros
 from openpilot.selfdrive.modeld.parse_model_outputs import Parser
 from openpilot.selfdrive.modeld.fill_model_msg import fill_model_msg, fill_pose_msg, PublishState
 from openpilot.selfdrive.modeld.constants import ModelConstants
@@ -28,7 +31,7 @@ from openpilot.selfdrive.frogpilot.controls.lib.frogpilot_variables import FrogP
 from openpilot.selfdrive.frogpilot.controls.lib.frogpilot_functions import MODELS_PATH
 from openpilot.selfdrive.frogpilot.controls.lib.model_manager import DEFAULT_MODEL
 
-frogpilot_toggles = FrogPilotVariables.toggles
+frogpilot_toggles = copy.copy(FrogPilotVariables.toggles)
 
 PROCESS_NAME = "selfdrive.modeld.modeld"
 SEND_RAW_PRED = os.getenv('SEND_RAW_PRED')
@@ -43,20 +46,57 @@ MODEL_PATHS = {
   ModelRunner.THNEED: Path(__file__).parent / ('models/supercombo.thneed' if MODEL_NAME == DEFAULT_MODEL else f'{MODELS_PATH}/{MODEL_NAME}.thneed'),
   ModelRunner.ONNX: Path(__file__).parent / 'models/supercombo.onnx'}
 
+# the engine is built from the selected model's ONNX, models only shipped as thneed stay on THNEED
+ENGINE_ONNX_PATH = Path(__file__).parent / ('models/supercombo.onnx' if MODEL_NAME == DEFAULT_MODEL else f'{MODELS_PATH}/{MODEL_NAME}.onnx')
+if USE_TENSORRT and ENGINE_ONNX_PATH.exists():
+  from openpilot.selfdrive.modeld.build_trt_engine import get_engine_config, get_engine_path
+  engine_config = get_engine_config(MODEL_NAME, DISABLE_NAV, DISABLE_RADAR, SECRET_GOOD_OPENPILOT)
+  # an INT8 engine calibrated offline with build_trt_engine.py takes precedence over the FP16 one built on first start
+  int8_engine_path = get_engine_path(ENGINE_ONNX_PATH, engine_config, 'int8')
+  MODEL_PATHS[ModelRunner.TENSORRT] = int8_engine_path if int8_engine_path.exists() else get_engine_path(ENGINE_ONNX_PATH, engine_config)
+  MODEL_PATHS[ModelRunner.TENSORRT_ONNX] = ENGINE_ONNX_PATH
+
 METADATA_PATH = Path(__file__).parent / ('models/supercombo_metadata.pkl' if not SECRET_GOOD_OPENPILOT else 'models/secret-good-openpilot_metadata.pkl')
 
+PASSTHROUGH_INPUTS = ('traffic_convention', 'lateral_control_params', 'nav_features', 'nav_instructions', 'radar_tracks')
+
+NAV_DIRECTION_IDXS = {
+  "left": 1, "slight left": 1, "sharp left": 1,
+  "right": 2, "slight right": 2, "sharp right": 2,
+}
+
 MODEL_WIDTH = 512
 MODEL_HEIGHT = 256
 MODEL_FRAME_SIZE = MODEL_WIDTH * MODEL_HEIGHT * 3 // 2
 
+def frogpilot_params_thread():
+  global frogpilot_toggles
+
+  update_toggles = False
+  while True:
+    # Update FrogPilot parameters
+    if FrogPilotVariables.toggles_updated:
+      update_toggles = True
+    elif update_toggles:
+      FrogPilotVariables.update_frogpilot_params()
+      # swap in a complete copy, the model loop never sees the toggles mid-update
+      frogpilot_toggles = copy.copy(FrogPilotVariables.toggles)
+      update_toggles = False
+    time.sleep(0.5)
+
 class FrameMeta:
-  frame_id: int = 0
-  timestamp_sof: int = 0
-  timestamp_eof: int = 0
+  __slots__ = ('frame_id', 'timestamp_sof', 'timestamp_eof')
+  frame_id: int
+  timestamp_sof: int
+  timestamp_eof: int
 
   def __init__(self, vipc=None):
+    self.frame_id, self.timestamp_sof, self.timestamp_eof = 0, 0, 0
     if vipc is not None:
-      self.frame_id, self.timestamp_sof, self.timestamp_eof = vipc.frame_id, vipc.timestamp_sof, vipc.timestamp_eof
+      self.update(vipc)
+
+  def update(self, vipc):
+    self.frame_id, self.timestamp_sof, self.timestamp_eof = vipc.frame_id, vipc.timestamp_sof, vipc.timestamp_eof
 
 class ModelState:
   frame: ModelFrame
@@ -70,105 +110,136 @@ class ModelState:
     self.frame = ModelFrame(context)
     self.wide_frame = ModelFrame(context)
     self.prev_desire = np.zeros(ModelConstants.DESIRE_LEN, dtype=np.float32)
+    self.desire_diff = np.zeros(ModelConstants.DESIRE_LEN, dtype=np.float32)
+    self.desire_rising = np.zeros(ModelConstants.DESIRE_LEN, dtype=bool)
+    self.new_desire = np.zeros(ModelConstants.DESIRE_LEN, dtype=np.float32)
     self.full_features_20Hz = np.zeros((ModelConstants.FULL_HISTORY_BUFFER_LEN, ModelConstants.FEATURE_LEN), dtype=np.float32)
     self.desire_20Hz =  np.zeros((ModelConstants.FULL_HISTORY_BUFFER_LEN + 1, ModelConstants.DESIRE_LEN), dtype=np.float32)
+    # the 20Hz histories are ring buffers, each head is the next slot to write (i.e. the oldest entry)
+    self.features_head = 0
+    self.desire_head = 0
+    # newest feature sits right before the head, so index -k of the history is at features_head - k
+    feature_idxs = np.arange(-4,-100,-4)[::-1]
+    self.feature_perms = (feature_idxs[None, :] + np.arange(len(self.full_features_20Hz))[:, None]) % len(self.full_features_20Hz)
     self.inputs = {
-      'desire': np.zeros(ModelConstants.DESIRE_LEN * (ModelConstants.HISTORY_BUFFER_LEN_SECRET+1 if SECRET_GOOD_OPENPILOT else ModelConstants.HISTORY_BUFFER_LEN+1), dtype=np.float32),
-      'traffic_convention': np.zeros(ModelConstants.TRAFFIC_CONVENTION_LEN, dtype=np.float32),
-      'lateral_control_params': np.zeros(ModelConstants.LATERAL_CONTROL_PARAMS_LEN, dtype=np.float32),
-      'prev_desired_curv': np.zeros(ModelConstants.PREV_DESIRED_CURV_LEN * (ModelConstants.HISTORY_BUFFER_LEN_SECRET+1 if SECRET_GOOD_OPENPILOT else ModelConstants.HISTORY_BUFFER_LEN+1), dtype=np.float32),
-      **({'nav_features': np.zeros(ModelConstants.NAV_FEATURE_LEN, dtype=np.float32),
-          'nav_instructions': np.zeros(ModelConstants.NAV_INSTRUCTION_LEN, dtype=np.float32)} if not DISABLE_NAV else {}),
-      'features_buffer': np.zeros((ModelConstants.HISTORY_BUFFER_LEN_SECRET if SECRET_GOOD_OPENPILOT else ModelConstants.HISTORY_BUFFER_LEN) * ModelConstants.FEATURE_LEN, dtype=np.float32),
-      **({'radar_tracks': np.zeros(ModelConstants.RADAR_TRACKS_LEN * ModelConstants.RADAR_TRACKS_WIDTH, dtype=np.float32)} if DISABLE_RADAR else {}),
+      'desire': host_zeros(ModelConstants.DESIRE_LEN * (ModelConstants.HISTORY_BUFFER_LEN_SECRET+1 if SECRET_GOOD_OPENPILOT else ModelConstants.HISTORY_BUFFER_LEN+1), dtype=np.float32),
+      'traffic_convention': host_zeros(ModelConstants.TRAFFIC_CONVENTION_LEN, dtype=np.float32),
+      'lateral_control_params': host_zeros(ModelConstants.LATERAL_CONTROL_PARAMS_LEN, dtype=np.float32),
+      'prev_desired_curv': host_zeros(ModelConstants.PREV_DESIRED_CURV_LEN * (ModelConstants.HISTORY_BUFFER_LEN_SECRET+1 if SECRET_GOOD_OPENPILOT else ModelConstants.HISTORY_BUFFER_LEN+1), dtype=np.float32),
+      **({'nav_features': host_zeros(ModelConstants.NAV_FEATURE_LEN, dtype=np.float32),
+          'nav_instructions': host_zeros(ModelConstants.NAV_INSTRUCTION_LEN, dtype=np.float32)} if not DISABLE_NAV else {}),
+      'features_buffer': host_zeros((ModelConstants.HISTORY_BUFFER_LEN_SECRET if SECRET_GOOD_OPENPILOT else ModelConstants.HISTORY_BUFFER_LEN) * ModelConstants.FEATURE_LEN, dtype=np.float32),
+      **({'radar_tracks': host_zeros(ModelConstants.RADAR_TRACKS_LEN * ModelConstants.RADAR_TRACKS_WIDTH, dtype=np.float32)} if DISABLE_RADAR else {}),
     }
 
-    self.input_imgs_20hz = np.zeros(MODEL_FRAME_SIZE*5, dtype=np.float32)
-    self.big_input_imgs_20hz = np.zeros(MODEL_FRAME_SIZE*5, dtype=np.float32)
-    self.input_imgs = np.zeros(MODEL_FRAME_SIZE*2, dtype=np.float32)
-    self.big_input_imgs = np.zeros(MODEL_FRAME_SIZE*2, dtype=np.float32)
-
     with open(METADATA_PATH, 'rb') as f:
       model_metadata = pickle.load(f)
 
     self.output_slices = model_metadata['output_slices']
     net_output_size = model_metadata['output_shapes']['outputs'][1]
-    self.output = np.zeros(net_output_size, dtype=np.float32)
+    self.output = host_zeros(net_output_size, dtype=np.float32)
+    # the runner writes into self.output in place, so these views stay valid across frames
+    self.sliced_outputs = {k: self.output[np.newaxis, v] for k,v in self.output_slices.items()}
+    self.raw_pred = np.zeros_like(self.output) if SEND_RAW_PRED else None
     self.parser = Parser()
 
     self.model = ModelRunner(MODEL_PATHS, self.output, Runtime.GPU, False, context)
     self.model.addInput("input_imgs", None)
     self.model.addInput("big_input_imgs", None)
+    self.features_buffer_2d = self.inputs['features_buffer'].reshape((-1, ModelConstants.FEATURE_LEN))
+    self.prev_desired_curv_tail = self.inputs['prev_desired_curv'][-ModelConstants.PREV_DESIRED_CURV_LEN:]
+    # inputs copied straight from the caller every frame, resolved once for the active nav/radar configuration
+    self.passthrough_inputs = [(k, self.inputs[k]) for k in PASSTHROUGH_INPUTS if k in self.inputs]
     for k,v in self.inputs.items():
       self.model.addInput(k, v)
 
-  def slice_outputs(self, model_outputs: np.ndarray) -> dict[str, np.ndarray]:
-    parsed_model_outputs = {k: model_outputs[np.newaxis, v] for k,v in self.output_slices.items()}
+    # keep the image history in the precision the runner consumes, FP16 halves the copies into a TensorRT engine
+    img_dtype = getattr(self.model, 'input_dtypes', {}).get('input_imgs', np.float32)
+    self.input_imgs_20hz = np.zeros(MODEL_FRAME_SIZE*5, dtype=img_dtype)
+    self.big_input_imgs_20hz = np.zeros(MODEL_FRAME_SIZE*5, dtype=img_dtype)
+    self.input_imgs = np.zeros(MODEL_FRAME_SIZE*2, dtype=img_dtype)
+    self.big_input_imgs = np.zeros(MODEL_FRAME_SIZE*2, dtype=img_dtype)
+
+  def slice_outputs(self) -> dict[str, np.ndarray]:
+    # shallow copy, the parser replaces and adds entries in the dict it is given
+    parsed_model_outputs = self.sliced_outputs.copy()
     if SEND_RAW_PRED:
-      parsed_model_outputs['raw_pred'] = model_outputs.copy()
+      np.copyto(self.raw_pred, self.output)
+      parsed_model_outputs['raw_pred'] = self.raw_pred
     return parsed_model_outputs
 
+  def pool_desire(self, pooled: np.ndarray) -> None:
+    # max-pool the desire ring oldest to newest in groups of 4 straight from the ring, the whole groups on either
+    # side of the wrap are contiguous slices and only the group straddling it is pooled from both ends
+    n, head = len(self.desire_20Hz), self.desire_head
+    before, straddle = divmod(n - head, 4)
+    np.max(self.desire_20Hz[head:head + 4*before].reshape((before, 4, ModelConstants.DESIRE_LEN)), axis=1, out=pooled[:before])
+    start = 0
+    if straddle:
+      np.max(self.desire_20Hz[n - straddle:], axis=0, out=pooled[before])
+      start = 4 - straddle
+      for row in self.desire_20Hz[:start]:
+        np.maximum(pooled[before], row, out=pooled[before])
+    after = len(pooled) - before - (1 if straddle else 0)
+    np.max(self.desire_20Hz[start:start + 4*after].reshape((after, 4, ModelConstants.DESIRE_LEN)), axis=1, out=pooled[len(pooled) - after:])
+
   def run(self, buf: VisionBuf, wbuf: VisionBuf, transform: np.ndarray, transform_wide: np.ndarray,
                 inputs: dict[str, np.ndarray], prepare_only: bool) -> dict[str, np.ndarray] | None:
     # Model decides when action is completed, so desire input is just a pulse triggered on rising edge
     inputs['desire'][0] = 0
+    np.subtract(inputs['desire'], self.prev_desire, out=self.desire_diff)
+    np.greater(self.desire_diff, .99, out=self.desire_rising)
+    np.multiply(inputs['desire'], self.desire_rising, out=self.new_desire)
 
     if SECRET_GOOD_OPENPILOT:
-      new_desire = np.where(inputs['desire'] - self.prev_desire > .99, inputs['desire'], 0)
-      self.desire_20Hz[:-1] = self.desire_20Hz[1:]
-      self.desire_20Hz[-1] = new_desire
-      self.inputs['desire'][:] = self.desire_20Hz.reshape((25,4,-1)).max(axis=1).flatten()
+      np.copyto(self.desire_20Hz[self.desire_head], self.new_desire)
+      self.desire_head = (self.desire_head + 1) % len(self.desire_20Hz)
+      self.pool_desire(self.inputs['desire'].reshape((25, ModelConstants.DESIRE_LEN)))
     else:
       self.inputs['desire'][:-ModelConstants.DESIRE_LEN] = self.inputs['desire'][ModelConstants.DESIRE_LEN:]
-      self.inputs['desire'][-ModelConstants.DESIRE_LEN:] = np.where(inputs['desire'] - self.prev_desire > .99, inputs['desire'], 0)
+      np.copyto(self.inputs['desire'][-ModelConstants.DESIRE_LEN:], self.new_desire)
 
-    self.prev_desire[:] = inputs['desire']
+    np.copyto(self.prev_desire, inputs['desire'])
 
-    self.inputs['traffic_convention'][:] = inputs['traffic_convention']
-    self.inputs['lateral_control_params'][:] = inputs['lateral_control_params']
-    if not DISABLE_NAV:
-      self.inputs['nav_features'][:] = inputs['nav_features']
-      self.inputs['nav_instructions'][:] = inputs['nav_instructions']
-    if DISABLE_RADAR:
-      self.inputs['radar_tracks'][:] = inputs['radar_tracks']
+    for k, buffer in self.passthrough_inputs:
+      np.copyto(buffer, inputs[k])
 
     if SECRET_GOOD_OPENPILOT:
-      new_img = self.frame.prepareSecret(buf, transform.flatten(), self.model.getCLBuffer("input_imgs"))
+      new_img = self.frame.prepareSecret(buf, transform.ravel(), self.model.getCLBuffer("input_imgs"))
       self.input_imgs_20hz[:-MODEL_FRAME_SIZE] = self.input_imgs_20hz[MODEL_FRAME_SIZE:]
-      self.input_imgs_20hz[-MODEL_FRAME_SIZE:] = new_img
+      np.copyto(self.input_imgs_20hz[-MODEL_FRAME_SIZE:], new_img)
       self.input_imgs[:MODEL_FRAME_SIZE] = self.input_imgs_20hz[:MODEL_FRAME_SIZE]
       self.input_imgs[MODEL_FRAME_SIZE:] = self.input_imgs_20hz[-MODEL_FRAME_SIZE:]
       self.model.setInputBuffer("input_imgs", self.input_imgs)
       if wbuf is not None:
-        new_big_img = self.wide_frame.prepareSecret(wbuf, transform_wide.flatten(), self.model.getCLBuffer("big_input_imgs"))
+        new_big_img = self.wide_frame.prepareSecret(wbuf, transform_wide.ravel(), self.model.getCLBuffer("big_input_imgs"))
         self.big_input_imgs_20hz[:-MODEL_FRAME_SIZE] = self.big_input_imgs_20hz[MODEL_FRAME_SIZE:]
-        self.big_input_imgs_20hz[-MODEL_FRAME_SIZE:] = new_big_img
+        np.copyto(self.big_input_imgs_20hz[-MODEL_FRAME_SIZE:], new_big_img)
         self.big_input_imgs[:MODEL_FRAME_SIZE] = self.big_input_imgs_20hz[:MODEL_FRAME_SIZE]
         self.big_input_imgs[MODEL_FRAME_SIZE:] = self.big_input_imgs_20hz[-MODEL_FRAME_SIZE:]
         self.model.setInputBuffer("big_input_imgs", self.big_input_imgs)
     else:
       # if getCLBuffer is not None, frame will be None
-      self.model.setInputBuffer("input_imgs", self.frame.prepare(buf, transform.flatten(), self.model.getCLBuffer("input_imgs")))
+      self.model.setInputBuffer("input_imgs", self.frame.prepare(buf, transform.ravel(), self.model.getCLBuffer("input_imgs")))
       if wbuf is not None:
-        self.model.setInputBuffer("big_input_imgs", self.wide_frame.prepare(wbuf, transform_wide.flatten(), self.model.getCLBuffer("big_input_imgs")))
+        self.model.setInputBuffer("big_input_imgs", self.wide_frame.prepare(wbuf, transform_wide.ravel(), self.model.getCLBuffer("big_input_imgs")))
 
     if prepare_only:
       return None
 
     self.model.execute()
-    outputs = self.parser.parse_outputs(self.slice_outputs(self.output), SECRET_GOOD_OPENPILOT)
+    outputs = self.parser.parse_outputs(self.slice_outputs(), SECRET_GOOD_OPENPILOT)
 
     if SECRET_GOOD_OPENPILOT:
-      self.full_features_20Hz[:-1] = self.full_features_20Hz[1:]
-      self.full_features_20Hz[-1] = outputs['hidden_state'][0, :]
-      idxs = np.arange(-4,-100,-4)[::-1]
-      self.inputs['features_buffer'][:] = self.full_features_20Hz[idxs].flatten()
+      np.copyto(self.full_features_20Hz[self.features_head], outputs['hidden_state'][0, :])
+      self.features_head = (self.features_head + 1) % len(self.full_features_20Hz)
+      np.take(self.full_features_20Hz, self.feature_perms[self.features_head], axis=0, out=self.features_buffer_2d)
     else:
       self.inputs['features_buffer'][:-ModelConstants.FEATURE_LEN] = self.inputs['features_buffer'][ModelConstants.FEATURE_LEN:]
-      self.inputs['features_buffer'][-ModelConstants.FEATURE_LEN:] = outputs['hidden_state'][0, :]
+      np.copyto(self.inputs['features_buffer'][-ModelConstants.FEATURE_LEN:], outputs['hidden_state'][0, :])
 
     self.inputs['prev_desired_curv'][:-ModelConstants.PREV_DESIRED_CURV_LEN] = self.inputs['prev_desired_curv'][ModelConstants.PREV_DESIRED_CURV_LEN:]
-    self.inputs['prev_desired_curv'][-ModelConstants.PREV_DESIRED_CURV_LEN:] = outputs['desired_curvature'][0, :]
+    np.copyto(self.prev_desired_curv_tail, outputs['desired_curvature'][0, :])
     return outputs
 
 
@@ -224,9 +295,21 @@ def main(demo=False):
 
   model_transform_main = np.zeros((3, 3), dtype=np.float32)
   model_transform_extra = np.zeros((3, 3), dtype=np.float32)
+  last_calib_euler = None
   live_calib_seen = False
   nav_features = np.zeros(ModelConstants.NAV_FEATURE_LEN, dtype=np.float32)
   nav_instructions = np.zeros(ModelConstants.NAV_INSTRUCTION_LEN, dtype=np.float32)
+  radar_tracks = np.zeros(ModelConstants.RADAR_TRACKS_LEN * ModelConstants.RADAR_TRACKS_WIDTH, dtype=np.float32)
+  vec_desire = np.zeros(ModelConstants.DESIRE_LEN, dtype=np.float32)
+  traffic_convention = np.zeros(ModelConstants.TRAFFIC_CONVENTION_LEN, dtype=np.float32)
+  lateral_control_params = np.zeros(ModelConstants.LATERAL_CONTROL_PARAMS_LEN, dtype=np.float32)
+  inputs:dict[str, np.ndarray] = {
+    'desire': vec_desire,
+    'traffic_convention': traffic_convention,
+    'lateral_control_params': lateral_control_params,
+    **({'nav_features': nav_features, 'nav_instructions': nav_instructions} if not DISABLE_NAV else {}),
+    **({'radar_tracks': radar_tracks,} if DISABLE_RADAR else {}),
+  }
   buf_main, buf_extra = None, None
   meta_main = FrameMeta()
   meta_extra = FrameMeta()
@@ -241,19 +324,23 @@ def main(demo=False):
 
   # TODO this needs more thought, use .2s extra for now to estimate other delays
   steer_delay = CP.steerActuatorDelay + .2
+  lateral_control_params[1] = steer_delay
 
   DH = DesireHelper()
 
   # FrogPilot variables
-  update_toggles = False
+  threading.Thread(target=frogpilot_params_thread, daemon=True).start()
 
   while True:
     # Keep receiving frames until we are at least 1 frame ahead of previous extra frame
-    while meta_main.timestamp_sof < meta_extra.timestamp_sof + 25000000:
-      buf_main = vipc_client_main.recv()
-      meta_main = FrameMeta(vipc_client_main)
-      if buf_main is None:
-        break
+    # recv blocks until the next frame and only hands over its metadata (the image stays in shared memory),
+    # so stale frames are skipped by checking the client's timestamps and only the chosen frame is snapshotted
+    if meta_main.timestamp_sof < meta_extra.timestamp_sof + 25000000:
+      while True:
+        buf_main = vipc_client_main.recv()
+        if buf_main is None or vipc_client_main.timestamp_sof >= meta_extra.timestamp_sof + 25000000:
+          break
+      meta_main.update(vipc_client_main)
 
     if buf_main is None:
       cloudlog.debug("vipc_client_main no frame")
@@ -263,9 +350,9 @@ def main(demo=False):
       # Keep receiving extra frames until frame id matches main camera
       while True:
         buf_extra = vipc_client_extra.recv()
-        meta_extra = FrameMeta(vipc_client_extra)
-        if buf_extra is None or meta_main.timestamp_sof < meta_extra.timestamp_sof + 25000000:
+        if buf_extra is None or meta_main.timestamp_sof < vipc_client_extra.timestamp_sof + 25000000:
           break
+      meta_extra.update(vipc_client_extra)
 
       if buf_extra is None:
         cloudlog.debug("vipc_client_extra no frame")
@@ -284,18 +371,21 @@ def main(demo=False):
     desire = DH.desire
     is_rhd = sm["driverMonitoringState"].isRHD
     frame_id = sm["roadCameraState"].frameId
-    lateral_control_params = np.array([sm["carState"].vEgo, steer_delay], dtype=np.float32)
+    lateral_control_params[0] = sm["carState"].vEgo
     if sm.updated["liveCalibration"] and sm.seen['roadCameraState'] and sm.seen['deviceState']:
       device_from_calib_euler = np.array(sm["liveCalibration"].rpyCalib, dtype=np.float32)
-      dc = DEVICE_CAMERAS[(str(sm['deviceState'].deviceType), str(sm['roadCameraState'].sensor))]
-      model_transform_main = get_warp_matrix(device_from_calib_euler, dc.ecam.intrinsics if main_wide_camera else dc.fcam.intrinsics, False).astype(np.float32)
-      model_transform_extra = get_warp_matrix(device_from_calib_euler, dc.ecam.intrinsics, True).astype(np.float32)
+      # liveCalibration keeps publishing the same rpy on steady driving, only rebuild the warps when it moves
+      if last_calib_euler is None or not np.array_equal(device_from_calib_euler, last_calib_euler):
+        dc = DEVICE_CAMERAS[(str(sm['deviceState'].deviceType), str(sm['roadCameraState'].sensor))]
+        model_transform_main = get_warp_matrix(device_from_calib_euler, dc.ecam.intrinsics if main_wide_camera else dc.fcam.intrinsics, False).astype(np.float32)
+        model_transform_extra = get_warp_matrix(device_from_calib_euler, dc.ecam.intrinsics, True).astype(np.float32)
+        last_calib_euler = device_from_calib_euler
       live_calib_seen = True
 
-    traffic_convention = np.zeros(2)
+    traffic_convention[:] = 0
     traffic_convention[int(is_rhd)] = 1
 
-    vec_desire = np.zeros(ModelConstants.DESIRE_LEN, dtype=np.float32)
+    vec_desire[:] = 0
     if desire >= 0 and desire < ModelConstants.DESIRE_LEN:
       vec_desire[desire] = 1
 
@@ -309,27 +399,21 @@ def main(demo=False):
       nav_instructions[:] = 0
 
     if nav_enabled and sm.updated["navModel"]:
-      nav_features = np.array(sm["navModel"].features)
+      nav_features[:] = sm["navModel"].features
 
     if nav_enabled and sm.updated["navInstruction"]:
+      maneuvers = np.array([(m.distance, NAV_DIRECTION_IDXS.get(m.modifier, 0)) for m in sm["navInstruction"].allManeuvers], dtype=np.float64).reshape(-1, 2)
+      distance_idxs = 25 + np.trunc(maneuvers[:, 0] / 20).astype(int)
+      direction_idxs = maneuvers[:, 1].astype(int)
+      valid = (distance_idxs >= 0) & (distance_idxs < 50)
       nav_instructions[:] = 0
-      for maneuver in sm["navInstruction"].allManeuvers:
-        distance_idx = 25 + int(maneuver.distance / 20)
-        direction_idx = 0
-        if maneuver.modifier in ("left", "slight left", "sharp left"):
-          direction_idx = 1
-        if maneuver.modifier in ("right", "slight right", "sharp right"):
-          direction_idx = 2
-        if 0 <= distance_idx < 50:
-          nav_instructions[distance_idx*3 + direction_idx] = 1
-
-    radar_tracks = np.zeros(ModelConstants.RADAR_TRACKS_LEN * ModelConstants.RADAR_TRACKS_WIDTH, dtype=np.float32)
+      nav_instructions[distance_idxs[valid]*3 + direction_idxs[valid]] = 1
+
+    radar_tracks[:] = 0
     if sm.updated["liveTracks"]:
-      for i, track in enumerate(sm["liveTracks"]):
-        if i >= ModelConstants.RADAR_TRACKS_LEN:
-          break
-        vec_index = i * ModelConstants.RADAR_TRACKS_WIDTH
-        radar_tracks[vec_index:vec_index+ModelConstants.RADAR_TRACKS_WIDTH] = [track.dRel, track.yRel, track.vRel]
+      tracks = islice(sm["liveTracks"], ModelConstants.RADAR_TRACKS_LEN)
+      track_data = np.fromiter(chain.from_iterable((track.dRel, track.yRel, track.vRel) for track in tracks), dtype=np.float32)
+      radar_tracks[:len(track_data)] = track_data
 
     # tracked dropped frames
     vipc_dropped_frames = max(0, meta_main.frame_id - last_vipc_frame_id - 1)
@@ -344,14 +428,6 @@ def main(demo=False):
     if prepare_only:
       cloudlog.error(f"skipping model eval. Dropped {vipc_dropped_frames} frames")
 
-    inputs:dict[str, np.ndarray] = {
-      'desire': vec_desire,
-      'traffic_convention': traffic_convention,
-      'lateral_control_params': lateral_control_params,
-      **({'nav_features': nav_features, 'nav_instructions': nav_instructions} if not DISABLE_NAV else {}),
-      **({'radar_tracks': radar_tracks,} if DISABLE_RADAR else {}),
-    }
-
     mt1 = time.perf_counter()
     model_output = model.run(buf_main, buf_extra, model_transform_main, model_transform_extra, inputs, prepare_only)
     mt2 = time.perf_counter()
@@ -378,13 +454,6 @@ def main(demo=False):
 
     last_vipc_frame_id = meta_main.frame_id
 
-    # Update FrogPilot parameters
-    if FrogPilotVariables.toggles_updated:
-      update_toggles = True
-    elif update_toggles:
-      FrogPilotVariables.update_frogpilot_params()
-      update_toggles = False
-
 if __name__ == "__main__":
   try:
     import argparse
@@ -1,18 +1,35 @@
 import os
+import numpy as np
 from openpilot.system.hardware import TICI
 from openpilot.selfdrive.modeld.runners.runmodel_pyx import RunModel, Runtime
 assert Runtime
 
 USE_THNEED = int(os.getenv('USE_THNEED', str(int(TICI))))
 USE_SNPE = int(os.getenv('USE_SNPE', str(int(TICI))))
+USE_TENSORRT = int(os.getenv('USE_TENSORRT', '0'))
+
+def host_zeros(shape, dtype=np.float32):
+  if USE_TENSORRT:
+    from openpilot.selfdrive.modeld.runners.trtmodel import pinned_zeros
+    return pinned_zeros(shape, dtype)
+  return np.zeros(shape, dtype=dtype)
 
 class ModelRunner(RunModel):
   THNEED = 'THNEED'
   SNPE = 'SNPE'
+  TENSORRT = 'TENSORRT'
   ONNX = 'ONNX'
+  TENSORRT_ONNX = 'TENSORRT_ONNX'  # graph the TENSORRT engine is built from when it isn't cached yet
 
   def __new__(cls, paths, *args, **kwargs):
-    if ModelRunner.THNEED in paths and USE_THNEED:
+    if ModelRunner.TENSORRT in paths and USE_TENSORRT and (paths[ModelRunner.TENSORRT].exists() or ModelRunner.TENSORRT_ONNX in paths):
+      from openpilot.selfdrive.modeld.runners.trtmodel import TRTModel as Runner
+      runner_type = ModelRunner.TENSORRT
+      if not paths[runner_type].exists():
+        # building autotunes kernels for the local GPU and takes minutes, so it only happens once per configuration
+        from openpilot.selfdrive.modeld.build_trt_engine import build_engine
+        build_engine(paths[ModelRunner.TENSORRT_ONNX], paths[runner_type])
+    elif ModelRunner.THNEED in paths and USE_THNEED:
       from openpilot.selfdrive.modeld.runners.thneedmodel_pyx import ThneedModel as Runner
       runner_type = ModelRunner.THNEED
     elif ModelRunner.SNPE in paths and USE_SNPE:
@@ -7,6 +7,8 @@ from typing import Any
 
 from openpilot.selfdrive.modeld.runners.runmodel_pyx import RunModel
 
+DUMP_INPUTS_DIR = os.getenv('DUMP_INPUTS_DIR')
+
 ORT_TYPES_TO_NP_TYPES = {'tensor(float16)': np.float16, 'tensor(float)': np.float32, 'tensor(uint8)': np.uint8}
 
 def attributeproto_fp16_to_fp32(attr):
@@ -62,6 +64,7 @@ class ONNXModel(RunModel):
     self.inputs = {}
     self.output = output
     self.use_tf8 = use_tf8
+    self.dump_count = 0
 
     self.session = create_ort_session(path, fp16_to_fp32=True)
     self.input_names = [x.name for x in self.session.get_inputs()]
@@ -87,6 +90,10 @@ class ONNXModel(RunModel):
   def execute(self):
     inputs = {k: (v.view(np.uint8) / 255. if self.use_tf8 and k == 'input_img' else v) for k,v in self.inputs.items()}
     inputs = {k: v.reshape(self.input_shapes[k]).astype(self.input_dtypes[k]) for k,v in inputs.items()}
+    if DUMP_INPUTS_DIR:
+      # e.g. replayed routes as calibration samples for build_trt_engine.py --calibration-dir
+      np.savez(os.path.join(DUMP_INPUTS_DIR, f'{self.dump_count:06d}.npz'), **inputs)
+      self.dump_count += 1
     outputs = self.session.run(None, inputs)
     assert len(outputs) == 1, "Only single model outputs are supported"
     self.output[:] = outputs[0]
@@ -0,0 +1,153 @@
+import sys
+import ctypes
+import numpy as np
+import tensorrt as trt
+from cuda import cudart
+
+from openpilot.selfdrive.modeld.runners.runmodel_pyx import RunModel
+
+TRT_LOGGER = trt.Logger(trt.Logger.WARNING)
+
+def cuda_call(call):
+  err, *res = call
+  if err != cudart.cudaError_t.cudaSuccess:
+    raise RuntimeError(f"CUDA error: {cudart.cudaGetErrorName(err)[1].decode()}")
+  if len(res) == 1:
+    return res[0]
+  return res or None
+
+def pinned_zeros(shape, dtype=np.float32):
+  # page-locked host memory lets H<->D copies DMA directly instead of staging through a bounce buffer,
+  # it is never freed since modeld keeps its buffers for the lifetime of the process
+  dtype = np.dtype(dtype)
+  nbytes = int(np.prod(shape)) * dtype.itemsize
+  ptr = cuda_call(cudart.cudaHostAlloc(nbytes, cudart.cudaHostAllocDefault))
+  buffer = np.frombuffer((ctypes.c_byte * nbytes).from_address(ptr), dtype=dtype).reshape(shape)
+  buffer[...] = 0
+  return buffer
+
+
+class TRTModel(RunModel):
+  def __init__(self, path, output, runtime, use_tf8, cl_context):
+    self.inputs = {}
+    self.output = output
+
+    with open(path, 'rb') as f, trt.Runtime(TRT_LOGGER) as trt_runtime:
+      self.engine = trt_runtime.deserialize_cuda_engine(f.read())
+    assert self.engine is not None, f"Couldn't deserialize TensorRT engine {path}"
+    self.context = self.engine.create_execution_context()
+    self.stream = cuda_call(cudart.cudaStreamCreate())
+    self.upload_stream = cuda_call(cudart.cudaStreamCreate())
+
+    tensor_names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+    self.input_names = [x for x in tensor_names if self.engine.get_tensor_mode(x) == trt.TensorIOMode.INPUT]
+    output_names = [x for x in tensor_names if x not in self.input_names]
+    assert len(output_names) == 1, "Only single model outputs are supported"
+    self.output_name = output_names[0]
+    output_dtype = np.dtype(trt.nptype(self.engine.get_tensor_dtype(self.output_name)))
+    output_size = trt.volume(self.engine.get_tensor_shape(self.output_name))
+    assert output_dtype == output.dtype and output_size == output.size, \
+      f"engine output is {output_size} x {output_dtype}, expected {output.size} x {output.dtype}"
+    self.input_shapes = {x: tuple(self.engine.get_tensor_shape(x)) for x in self.input_names}
+    self.input_dtypes = {x: np.dtype(trt.nptype(self.engine.get_tensor_dtype(x))) for x in self.input_names}
+
+    # one device allocation per binding, bound to the execution context for the lifetime of the runner
+    self.device_buffers = {}
+    for name in tensor_names:
+      nbytes = trt.volume(self.engine.get_tensor_shape(name)) * np.dtype(trt.nptype(self.engine.get_tensor_dtype(name))).itemsize
+      self.device_buffers[name] = cuda_call(cudart.cudaMalloc(nbytes))
+      cuda_call(cudart.cudaMemset(self.device_buffers[name], 0, nbytes))
+      self.context.set_tensor_address(name, self.device_buffers[name])
+
+    # inputs set every frame through setInputBuffer (the camera frames) are uploaded on their own stream as soon
+    # as they are set, overlapping the copy with the rest of the frame's preparation. Two host staging buffers
+    # alternate so a new frame can be written while the previous upload may still be in flight.
+    self.staging = {}
+    self.upload_done = {}
+    self.upload_slot = {}
+
+    # the whole per-frame enqueue is captured once into a CUDA graph and replayed, which needs
+    # every host buffer to stay at a fixed, page-locked address for the lifetime of the runner
+    self.graph_exec = None
+    self.registered = []
+    self.register_host(self.output)
+    print("ready to run TensorRT engine", self.input_shapes, file=sys.stderr)
+
+  def __del__(self):
+    if self.graph_exec is not None:
+      cudart.cudaGraphExecDestroy(self.graph_exec)
+    for events in self.upload_done.values():
+      for event in events:
+        cudart.cudaEventDestroy(event)
+    for buf in self.registered:
+      cudart.cudaHostUnregister(buf.ctypes.data)
+    for ptr in self.device_buffers.values():
+      cudart.cudaFree(ptr)
+    cudart.cudaStreamDestroy(self.upload_stream)
+    cudart.cudaStreamDestroy(self.stream)
+
+  def register_host(self, buffer):
+    assert buffer.flags['C_CONTIGUOUS']
+    if cuda_call(cudart.cudaPointerGetAttributes(buffer.ctypes.data)).type == cudart.cudaMemoryType.cudaMemoryTypeHost:
+      return
+    cuda_call(cudart.cudaHostRegister(buffer.ctypes.data, buffer.nbytes, cudart.cudaHostRegisterDefault))
+    self.registered.append(buffer)
+
+  def addInput(self, name, buffer):
+    assert name in self.input_names
+    if buffer is None:
+      self.staging[name] = [pinned_zeros(trt.volume(self.input_shapes[name]), dtype=self.input_dtypes[name]) for _ in range(2)]
+      self.upload_done[name] = [cuda_call(cudart.cudaEventCreateWithFlags(cudart.cudaEventDisableTiming)) for _ in range(2)]
+      self.upload_slot[name] = 0
+      return
+    assert buffer.dtype == self.input_dtypes[name], f"{name} expects {self.input_dtypes[name]}, got {buffer.dtype}"
+    # the captured copy moves buffer.nbytes into a device buffer sized by the engine shape
+    assert buffer.size == trt.volume(self.input_shapes[name]), f"{name} expects {trt.volume(self.input_shapes[name])} values, got {buffer.size}"
+    self.register_host(buffer)
+    self.inputs[name] = buffer
+
+  def setInputBuffer(self, name, buffer):
+    assert name in self.inputs or name in self.staging
+    if buffer is None:
+      return
+    if name not in self.staging:
+      np.copyto(self.inputs[name], buffer)
+      return
+
+    slot = self.upload_slot[name] ^ 1
+    host_buffer, done = self.staging[name][slot], self.upload_done[name][slot]
+    cuda_call(cudart.cudaEventSynchronize(done))
+    np.copyto(host_buffer, buffer)
+    cuda_call(cudart.cudaMemcpyAsync(self.device_buffers[name], host_buffer.ctypes.data, host_buffer.nbytes,
+                                     cudart.cudaMemcpyKind.cudaMemcpyHostToDevice, self.upload_stream))
+    cuda_call(cudart.cudaEventRecord(done, self.upload_stream))
+    self.upload_slot[name] = slot
+
+  def getCLBuffer(self, name):
+    return None
+
+  def enqueue(self):
+    for k,v in self.inputs.items():
+      cuda_call(cudart.cudaMemcpyAsync(self.device_buffers[k], v.ctypes.data, v.nbytes, cudart.cudaMemcpyKind.cudaMemcpyHostToDevice, self.stream))
+    self.context.execute_async_v3(self.stream)
+    cuda_call(cudart.cudaMemcpyAsync(self.output.ctypes.data, self.device_buffers[self.output_name], self.output.nbytes,
+                                     cudart.cudaMemcpyKind.cudaMemcpyDeviceToHost, self.stream))
+
+  def execute(self):
+    # inference only has to wait for the latest upload of each frame, not block the host on it
+    for name, slot in self.upload_slot.items():
+      cuda_call(cudart.cudaStreamWaitEvent(self.stream, self.upload_done[name][slot], 0))
+
+    if self.graph_exec is None:
+      # TensorRT defers some setup to the first enqueue, which can't be captured, so run it eagerly once
+      self.enqueue()
+      cuda_call(cudart.cudaStreamSynchronize(self.stream))
+      cuda_call(cudart.cudaStreamBeginCapture(self.stream, cudart.cudaStreamCaptureMode.cudaStreamCaptureModeGlobal))
+      self.enqueue()
+      graph = cuda_call(cudart.cudaStreamEndCapture(self.stream))
+      self.graph_exec = cuda_call(cudart.cudaGraphInstantiate(graph, 0))
+      cuda_call(cudart.cudaGraphDestroy(graph))
+    else:
+      cuda_call(cudart.cudaGraphLaunch(self.graph_exec, self.stream))
+    cuda_call(cudart.cudaStreamSynchronize(self.stream))
+    return self.output
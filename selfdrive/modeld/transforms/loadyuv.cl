@@ -15,15 +15,9 @@ __kernel void loadys(__global uchar8 const * const Y,
     // 02
     // 13
 
-    __global float* outy0;
-    __global float* outy1;
-    if ((oy & 1) == 0) {
-      outy0 = out + out_offset; //y0
-      outy1 = out + out_offset + UV_SIZE*2; //y2
-    } else {
-      outy0 = out + out_offset + UV_SIZE; //y1
-      outy1 = out + out_offset + UV_SIZE*3; //y3
-    }
+    // even rows write y0/y2, odd rows y1/y3, selected without diverging
+    __global float* outy0 = out + out_offset + (oy & 1) * UV_SIZE; //y0 or y1
+    __global float* outy1 = outy0 + UV_SIZE*2; //y2 or y3
 
     vstore4(ysf.s0246, 0, outy0 + (oy/2) * (TRANSFORMED_WIDTH/2) + ox/2);
     vstore4(ysf.s1357, 0, outy1 + (oy/2) * (TRANSFORMED_WIDTH/2) + ox/2);